@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Client
+==================
+
+One urllib3 connection pool shared by test_api.py and test_discord.py, so
+scripts running in the same interpreter reuse connections and TLS sessions
+instead of each building their own.
+"""
+
+import urllib3
+
+# Parse response bodies with the faster orjson when it is installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Fail fast on connect problems, allow the remote end more time to answer
+DEFAULT_TIMEOUT = urllib3.Timeout(connect=5, read=25)
+
+# Retry transient failures and rate limits, honoring Retry-After. Plain HTTP/1.1
+# keep-alive is enough: the scripts send their requests one after another, so
+# there is nothing for HTTP/2 multiplexing to overlap.
+POOL = urllib3.PoolManager(
+    num_pools=4,
+    maxsize=8,
+    timeout=DEFAULT_TIMEOUT,
+    retries=urllib3.Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        respect_retry_after_header=True,
+        raise_on_status=False  # Callers report the final status themselves
+    )
+)
+
+
+def is_timeout(error):
+    """Whether a MaxRetryError was caused by a timeout rather than a failed connection"""
+    # urllib3 derives NewConnectionError (e.g. refused) from its TimeoutError
+    return (isinstance(error.reason, urllib3.exceptions.TimeoutError)
+            and not isinstance(error.reason, urllib3.exceptions.NewConnectionError))
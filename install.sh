@@ -37,6 +37,8 @@ cp production_monitor.py $INSTALL_DIR/
 cp config.py $INSTALL_DIR/
 cp test_discord.py $INSTALL_DIR/
 cp test_api.py $INSTALL_DIR/
+cp server_cache.py $INSTALL_DIR/
+cp http_client.py $INSTALL_DIR/
 cp requirements.txt $INSTALL_DIR/
 cp README.md $INSTALL_DIR/
 cp -r hetzner $INSTALL_DIR/ 2>/dev/null || echo "⚠️  Hetzner directory not found, skipping..."
@@ -14,23 +14,29 @@ No emojis - just reliable monitoring!
 """
 
 import os
-import sys
 import time
+import signal
 import socket
-import subprocess
+import struct
+import json
+import base64
 import logging
-import schedule
+from logging.handlers import RotatingFileHandler
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from config import *
-
-# Import Discord config if available
+# Use the faster orjson parser/serializer when it is installed
 try:
-    from config import DISCORD_NOTIFICATIONS
+    import orjson
 except ImportError:
-    DISCORD_NOTIFICATIONS = {"enabled": False}
+    orjson = None
+
+import config
+import server_cache
 
 # Configure logging without Unicode issues
 log_handlers = []
@@ -38,12 +44,17 @@ log_handlers = []
 # Always add console output
 log_handlers.append(logging.StreamHandler())
 
-# Add file handler if not running as systemd service
+# Add rotating file handler if not running as systemd service
 if not os.environ.get('JOURNAL_STREAM'):
-    log_handlers.append(logging.FileHandler('server_monitor.log', encoding='utf-8'))
+    log_handlers.append(RotatingFileHandler(
+        getattr(config, 'LOG_FILE', 'server_monitor.log'),
+        maxBytes=getattr(config, 'LOG_MAX_SIZE_MB', 10) * 1024 * 1024,
+        backupCount=getattr(config, 'LOG_BACKUP_COUNT', 5),
+        encoding='utf-8'
+    ))
 
 logging.basicConfig(
-    level=logging.INFO,
+    level=getattr(logging, str(getattr(config, 'LOG_LEVEL', 'INFO')).upper(), logging.INFO),
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=log_handlers
 )
@@ -51,145 +62,254 @@ logger = logging.getLogger('ProductionMonitor')
 
 
 class ProductionServerMonitor:
+    DISCORD_STATUS_FIELDS = {
+        "offline": {"name": "Status", "value": ":red_circle: OFFLINE", "inline": True},
+        "online": {"name": "Status", "value": ":green_circle: ONLINE", "inline": True},
+        "restart": {"name": "Status", "value": ":yellow_circle: RESTARTING", "inline": True}
+    }
+    DISCORD_FOOTER = {
+        "text": "Server Monitor",
+        "icon_url": "https://cdn.discordapp.com/emojis/1234567890123456789.png"  # Optional
+    }
+    
+    HETZNER_API_URL = "https://robot-ws.your-server.de"
+    JSON_HEADERS = {"Content-Type": "application/json"}
+    
+    # A server that goes offline again within this window of a false alarm is
+    # flapping; its offline/false-alarm pair is logged but not notified
+    NOTIFICATION_COOLDOWN_SECONDS = 300
+    
+    MANUAL_RESTART_TEMPLATE = """
+MANUAL SERVER RESTART REQUIRED
+
+Server: {server_ip}
+Time: {time}
+
+RESTART METHODS:
+
+1. Hetzner Robot Web Interface:
+   - URL: https://robot.hetzner.com/
+   - Login: {username}
+   - Navigate to server: {server_ip}
+   - Click: Reset -> Hardware Reset
+
+2. Hetzner Support:
+   - Phone: +49 9831 505-0 (24/7)
+   - Email: support@hetzner.com
+   - Server IP: {server_ip}
+
+3. Remote Management:
+   - Check for IPMI/iDRAC access
+   - Use out-of-band management if available
+
+Monitor will continue checking for recovery every {interval} minutes...
+"""
+    
     def __init__(self):
-        self.server_ip = SERVER_IP
-        self.monitoring_mode = getattr(sys.modules['config'], 'MONITORING_MODE', 'ssh')
+        # Bind config once; the monitor loop only reads attributes from here on
+        self.server_ip = config.SERVER_IP
+        self.monitoring_mode = getattr(config, 'MONITORING_MODE', 'ssh')
+        self.check_interval_minutes = config.CHECK_INTERVAL_MINUTES
+        self.verification_count = getattr(config, 'VERIFICATION_CHECKS', 3)
+        self.verification_interval = getattr(config, 'VERIFICATION_INTERVAL_SECONDS', 30)
+        self.restart_wait_seconds = getattr(config, 'RESTART_WAIT_MINUTES', 5) * 60
+        self.check_timeout = getattr(config, 'CHECK_TIMEOUT_SECONDS', 2)
+        self.verification_timeout = getattr(config, 'SSH_TIMEOUT', 10)
         self.is_server_online = True
         self.last_check_time = None
         self.offline_start_time = None
         self.consecutive_failures = 0
         self.restart_attempts = 0
+        self._stop_event = threading.Event()
+        self._server_number = None
+        self._last_false_alarm = None
+        self._offline_alert_sent = False
+        
+        # Only the timestamp changes between manual restart instructions
+        self._manual_fields = {
+            'server_ip': self.server_ip,
+            'username': config.HETZNER_USERNAME,
+            'interval': self.check_interval_minutes
+        }
+        
+        # Discord settings never change at runtime, so build the static
+        # parts of every webhook payload once
+        discord_config = getattr(config, 'DISCORD_NOTIFICATIONS', {"enabled": False})
+        self._discord_enabled = discord_config.get("enabled", False)
+        self._discord_webhook = discord_config.get("webhook_url")
+        self._discord_timeout = discord_config.get("timeout", 30)
+        color_map = discord_config.get("embed_color", {})
+        self._discord_color_map = color_map if isinstance(color_map, dict) else {}
+        self._discord_static_fields = [
+            {"name": "Server IP", "value": self.server_ip, "inline": True},
+            {"name": "Monitor Type", "value": self.monitoring_mode, "inline": True}
+        ]
+        
+        self._discord_payload_base = {"username": discord_config.get("username", "Server Monitor")}
+        if discord_config.get("avatar_url"):
+            self._discord_payload_base["avatar_url"] = discord_config["avatar_url"]
+        
+        mentions = []
+        if discord_config.get("mention_role"):
+            mentions.append(f"<@&{discord_config['mention_role']}>")
+        if discord_config.get("mention_user"):
+            mentions.append(f"<@{discord_config['mention_user']}>")
+        if mentions:
+            self._discord_payload_base["content"] = " ".join(mentions)
+        
+        # Discord notifications are delivered by a background worker
+        self._notify_queue = queue.Queue(maxsize=100)
+        threading.Thread(target=self._notify_worker, name="discord-notify", daemon=True).start()
+        
+        # Reuse one keep-alive connection to the Robot API across calls
+        # with the Basic auth header encoded once instead of on every request
+        credentials = f"{config.HETZNER_USERNAME}:{config.HETZNER_PASSWORD}"
+        self._api_headers = {
+            'Authorization': 'Basic ' + base64.b64encode(credentials.encode('ascii')).decode('ascii'),
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self._api_headers)
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4))
         
         logger.info("ProductionServerMonitor initialized")
         logger.info("Server: %s", self.server_ip)
         logger.info("Monitoring mode: %s", self.monitoring_mode)
         
-    def check_ssh_connectivity(self, timeout=10):
-        """Check SSH connectivity"""
+    def _probe_port(self, port, timeout=2):
+        """Check whether a TCP port accepts connections"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((self.server_ip, 22))
-            sock.close()
-            return result == 0
-        except Exception as e:
-            logger.debug("SSH check error: %s", e)
+            with socket.create_connection((self.server_ip, port), timeout=timeout) as sock:
+                # Reset on close so repeated probes don't pile up in TIME_WAIT
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            return True
+        except OSError as e:
+            logger.debug("Port %d check error: %s", port, e)
             return False
     
-    def check_http_service(self, port=80, timeout=10):
-        """Check HTTP service"""
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((self.server_ip, port))
-            sock.close()
-            return result == 0
-        except Exception as e:
-            logger.debug("HTTP check error: %s", e)
-            return False
+    def run_comprehensive_checks(self, timeout=None):
+        """Run connectivity checks, stopping at the first one that proves the server is up"""
+        if timeout is None:
+            timeout = self.check_timeout
+        
+        # SSH answers on almost every healthy check, so try it on its own first
+        if self._probe_port(22, timeout):
+            checks = {'ssh': True}
+            logger.debug("Check results: %s", checks)
+            return True, checks
+        
+        # Fall back to the web ports, probed side by side since both are network-bound
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                'http': executor.submit(self._probe_port, 80, timeout),
+                'https': executor.submit(self._probe_port, 443, timeout)
+            }
+            checks = {'ssh': False}
+            checks.update((name, future.result()) for name, future in futures.items())
+        
+        # Server is considered online if SSH works OR HTTP/HTTPS works. An open
+        # TCP port is stronger evidence than an ICMP echo, so there is no ping.
+        web_online = checks['http'] or checks['https']
+        
+        logger.debug("Check results: %s", checks)
+        
+        return web_online, checks
     
-    def check_https_service(self, port=443, timeout=10):
-        """Check HTTPS service"""
+    def _resolve_server_number(self):
+        """Look up the Hetzner server number for our IP, returning (number, error)"""
+        if self._server_number is not None:
+            return self._server_number, None
+        
+        server_number = server_cache.load_server_number(self.server_ip)
+        if server_number is not None:
+            logger.info("Using cached server number for %s: %s", self.server_ip, server_number)
+            self._server_number = server_number
+            return server_number, None
+        
+        logger.info("Fetching server list from Hetzner Robot API...")
+        
+        # Revalidate an expired cache entry so an unchanged list costs no body transfer
+        cached_number, validators = server_cache.load_validators(self.server_ip)
+        response = self.session.get(f"{self.HETZNER_API_URL}/server", headers=validators, timeout=30)
+        logger.info("Server list response: HTTP %d", response.status_code)
+        
+        if response.status_code == 304 and cached_number is not None:
+            logger.info("Server list unchanged, reusing server number %s", cached_number)
+            server_number = cached_number
+        elif response.status_code == 401:
+            logger.error("API authentication failed - invalid credentials")
+            return None, "Invalid Hetzner Robot API credentials"
+        elif response.status_code != 200:
+            logger.error("Failed to get server list: %d - %s", response.status_code, response.text)
+            return None, f"API request failed: HTTP {response.status_code}"
+        else:
+            # Find our server
+            servers_data = orjson.loads(response.content) if orjson else response.json()
+            server_number = next(
+                (entry['server']['server_number'] for entry in servers_data
+                 if entry['server']['server_ip'] == self.server_ip),
+                None
+            )
+            if server_number is None:
+                logger.error("Server %s not found in Hetzner account", self.server_ip)
+                return None, f"Server {self.server_ip} not found in your Hetzner account"
+            logger.info("Found server %s with number: %s", self.server_ip, server_number)
+        
+        self._server_number = server_number
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((self.server_ip, port))
-            sock.close()
-            return result == 0
-        except Exception as e:
-            logger.debug("HTTPS check error: %s", e)
-            return False
+            sent = validators if response.status_code == 304 else None
+            server_cache.save_server_number(
+                self.server_ip, server_number,
+                **server_cache.response_validators(response.headers, sent)
+            )
+        except OSError as e:
+            logger.warning("Could not write server cache: %s", e)
+        
+        return server_number, None
     
-    def check_ping(self, timeout=10):
-        """Check ping connectivity"""
+    def _forget_server_number(self):
+        """Drop the remembered server number so the next API call looks it up again"""
+        self._server_number = None
         try:
-            result = subprocess.run(
-                ['ping', '-n', '1', '-w', str(timeout * 1000), self.server_ip],
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
-            return result.returncode == 0
-        except Exception as e:
-            logger.debug("Ping check error: %s", e)
-            return False
+            server_cache.forget_server_number(self.server_ip)
+        except OSError as e:
+            logger.warning("Could not update server cache: %s", e)
     
-    def run_comprehensive_checks(self):
-        """Run all connectivity checks"""
-        checks = {
-            'ssh': self.check_ssh_connectivity(),
-            'http': self.check_http_service(),
-            'https': self.check_https_service(),
-            'ping': self.check_ping()
-        }
-        
-        # Server is considered online if SSH works OR (HTTP/HTTPS + ping work)
-        ssh_online = checks['ssh']
-        web_online = (checks['http'] or checks['https']) and checks['ping']
-        
-        logger.debug("Check results: %s", checks)
-        
-        return ssh_online or web_online, checks
+    def _reset_url(self, server_number):
+        """Return the Robot API reset endpoint for a server number"""
+        return f"{self.HETZNER_API_URL}/reset/{server_number}"
+    
+    def _describe_reset_error(self, response, server_number):
+        """Turn a failed /reset response into a human readable reason"""
+        if response.status_code == 401:
+            return "Invalid Hetzner Robot API credentials"
+        elif response.status_code == 403:
+            return f"Reset permission denied for server #{server_number}"
+        elif response.status_code == 404:
+            return f"Server #{server_number} not found or reset not available"
+        return f"API error {response.status_code}: {response.text}"
     
-    def verify_api_restart_capability(self):
-        """Verify that API restart would work without actually executing it"""
+    def verify_api_at_startup(self):
+        """Verify once at startup that API restart would work without executing it"""
         try:
             logger.info("VERIFY: Testing Hetzner Robot API access...")
             
-            # Prepare authentication
-            auth_string = f"{HETZNER_USERNAME}:{HETZNER_PASSWORD}"
-            auth_bytes = auth_string.encode('ascii')
-            auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-            
-            headers = {
-                'Authorization': f'Basic {auth_b64}',
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-            
-            # Test API access by getting server list
-            servers_url = "https://robot-ws.your-server.de/server"
-            logger.info("VERIFY: Testing API connection...")
-            
-            response = requests.get(servers_url, headers=headers, timeout=30)
-            logger.info("VERIFY: API response: HTTP %d", response.status_code)
-            
-            if response.status_code == 401:
-                logger.error("VERIFY: API authentication failed - invalid credentials")
-                return False, "Invalid Hetzner Robot API credentials"
-            elif response.status_code != 200:
-                logger.error("VERIFY: API request failed: %d - %s", response.status_code, response.text)
-                return False, f"API request failed: HTTP {response.status_code}"
-            
-            # Check if our server exists in the account
-            servers_data = response.json()
-            server_number = None
-            server_found = False
-            
-            for server_entry in servers_data:
-                server_info = server_entry['server']
-                if server_info['server_ip'] == self.server_ip:
-                    server_number = server_info['server_number']
-                    server_found = True
-                    logger.info("VERIFY: Found server %s with number: %s", self.server_ip, server_number)
-                    break
-            
-            if not server_found:
-                logger.error("VERIFY: Server %s not found in Hetzner account", self.server_ip)
-                return False, f"Server {self.server_ip} not found in your Hetzner account"
+            # Check that our server exists in the account
+            server_number, error = self._resolve_server_number()
+            if error:
+                return False, error
             
-            # Test if reset endpoint is accessible (without actually triggering it)
-            reset_url = f"https://robot-ws.your-server.de/reset/{server_number}"
+            # Reading the reset options proves credentials and access without triggering a reset
             logger.info("VERIFY: Testing reset endpoint access...")
             
-            # Use HEAD request to test endpoint without triggering action
-            test_response = requests.head(reset_url, headers=headers, timeout=30)
-            
-            if test_response.status_code == 404:
-                logger.error("VERIFY: Reset endpoint not found for server #%s", server_number)
-                return False, f"Reset endpoint not available for server #{server_number}"
-            elif test_response.status_code == 403:
-                logger.error("VERIFY: Reset permission denied for server #%s", server_number)
-                return False, f"Reset permission denied for server #{server_number}"
+            response = self.session.get(self._reset_url(server_number), timeout=30)
+            if response.status_code != 200:
+                if response.status_code == 404:
+                    # The number may be stale (e.g. hardware swapped behind our IP)
+                    self._forget_server_number()
+                error = self._describe_reset_error(response, server_number)
+                logger.error("VERIFY: %s", error)
+                return False, error
             
             logger.info("VERIFY: ✅ API restart capability verified successfully!")
             return True, f"API restart ready for server #{server_number}"
@@ -209,55 +329,38 @@ class ProductionServerMonitor:
         try:
             logger.info("Attempting server restart via Hetzner Robot API...")
             
-            # Prepare authentication
-            auth_string = f"{HETZNER_USERNAME}:{HETZNER_PASSWORD}"
-            auth_bytes = auth_string.encode('ascii')
-            auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-            
-            headers = {
-                'Authorization': f'Basic {auth_b64}',
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-            
             # Get server information
-            servers_url = "https://robot-ws.your-server.de/server"
-            logger.info("Fetching server list from Hetzner Robot API...")
-            
-            response = requests.get(servers_url, headers=headers, timeout=30)
-            logger.info("Server list response: HTTP %d", response.status_code)
-            
-            if response.status_code == 200:
-                servers_data = response.json()
-                server_number = None
-                
-                # Find our server
-                for server_entry in servers_data:
-                    server_info = server_entry['server']
-                    if server_info['server_ip'] == self.server_ip:
-                        server_number = server_info['server_number']
-                        logger.info("Found server %s with number: %s", self.server_ip, server_number)
-                        break
-                
-                if server_number:
-                    # Send restart command
-                    reset_url = f"https://robot-ws.your-server.de/reset/{server_number}"
-                    reset_data = {'type': 'sw'}  # Software reboot
-                    
-                    logger.info("Sending restart command to server #%s...", server_number)
-                    reset_response = requests.post(reset_url, headers=headers, data=reset_data, timeout=30)
-                    
-                    if reset_response.status_code == 200:
-                        logger.info("SUCCESS: Server restart command sent successfully!")
-                        return True, f"API restart initiated for server #{server_number}"
-                    else:
-                        logger.error("FAILED: API restart failed: %d - %s", reset_response.status_code, reset_response.text)
-                        return False, f"API error {reset_response.status_code}: {reset_response.text}"
-                else:
-                    logger.error("FAILED: Server %s not found in API response", self.server_ip)
-                    return False, "Server not found in Hetzner Robot API"
+            server_number, error = self._resolve_server_number()
+            if error:
+                return False, error
+            
+            # Send restart command
+            reset_data = {'type': 'sw'}  # Software reboot
+            
+            logger.info("Sending restart command to server #%s...", server_number)
+            reset_response = self.session.post(self._reset_url(server_number), data=reset_data, timeout=30)
+            
+            if reset_response.status_code == 404:
+                # The number may be stale (e.g. hardware swapped behind our IP), so look
+                # it up again and retry once if the server list now maps us elsewhere
+                stale_number = server_number
+                self._forget_server_number()
+                server_number, error = self._resolve_server_number()
+                if error:
+                    return False, error
+                if server_number != stale_number:
+                    logger.info("Server number changed from #%s to #%s, retrying restart...",
+                                stale_number, server_number)
+                    reset_response = self.session.post(self._reset_url(server_number), data=reset_data, timeout=30)
+            
+            if reset_response.status_code == 200:
+                logger.info("SUCCESS: Server restart command sent successfully!")
+                return True, f"API restart initiated for server #{server_number}"
             else:
-                logger.error("FAILED: Failed to get server list: %d - %s", response.status_code, response.text)
-                return False, f"API authentication failed: {response.status_code}"
+                # The POST status tells us why the restart failed, no pre-flight check needed
+                error = self._describe_reset_error(reset_response, server_number)
+                logger.error("FAILED: API restart failed: %s", error)
+                return False, error
                 
         except requests.exceptions.Timeout:
             logger.error("FAILED: API request timeout")
@@ -271,34 +374,11 @@ class ProductionServerMonitor:
     
     def provide_manual_restart_instructions(self):
         """Provide manual restart instructions"""
-        instructions = f"""
-MANUAL SERVER RESTART REQUIRED
-
-Server: {self.server_ip}
-Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-RESTART METHODS:
-
-1. Hetzner Robot Web Interface:
-   - URL: https://robot.hetzner.com/
-   - Login: {HETZNER_USERNAME}
-   - Navigate to server: {self.server_ip}
-   - Click: Reset -> Hardware Reset
-
-2. Hetzner Support:
-   - Phone: +49 9831 505-0 (24/7)
-   - Email: support@hetzner.com
-   - Server IP: {self.server_ip}
-
-3. Remote Management:
-   - Check for IPMI/iDRAC access
-   - Use out-of-band management if available
-
-Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minutes...
-"""
-        logger.warning("Manual restart instructions:")
-        for line in instructions.strip().split('\n'):
-            logger.info(line)
+        instructions = self.MANUAL_RESTART_TEMPLATE.format(
+            time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            **self._manual_fields
+        )
+        logger.warning("Manual restart instructions:\n%s", instructions.strip())
         
         return instructions
     
@@ -307,27 +387,6 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
         self.restart_attempts += 1
         logger.info("=== RESTART ATTEMPT #%d ===", self.restart_attempts)
         
-        # First verify that API restart would work
-        logger.info("VERIFY: Checking API restart capability before proceeding...")
-        api_capable, api_message = self.verify_api_restart_capability()
-        
-        if not api_capable:
-            logger.error("VERIFY: ❌ API restart verification failed: %s", api_message)
-            self.send_notification(
-                "❌ Restart Failed - API Issue",
-                f"Cannot restart server {self.server_ip} via API!\n"
-                f"Issue: {api_message}\n\n"
-                f"**Manual Action Required:**\n"
-                f"1. Check Hetzner Robot API credentials\n"
-                f"2. Verify server is in your Hetzner account\n"
-                f"3. Manually restart server if needed\n"
-                f"4. Fix API access for future automation",
-                "warning"
-            )
-            return False
-        
-        logger.info("VERIFY: ✅ API restart capability confirmed - proceeding with restart...")
-        
         # Try API restart
         api_success, api_details = self.restart_server_via_api()
         
@@ -336,7 +395,7 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
                 "Server Restart Initiated",
                 f"Server {self.server_ip} restart initiated via Hetzner Robot API.\n"
                 f"Details: {api_details}\n"
-                f"Waiting 5 minutes for server to restart...",
+                f"Waiting up to {self.restart_wait_seconds:.0f} seconds for server to restart...",
                 "restart"
             )
             return True
@@ -364,8 +423,7 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
         logger.info("MESSAGE:\n%s", full_message)
         
         # Discord webhook notifications
-        discord_config = getattr(sys.modules['config'], 'DISCORD_NOTIFICATIONS', {"enabled": False})
-        if discord_config.get("enabled", False):
+        if self._discord_enabled:
             try:
                 self.send_discord_notification(subject, message, notification_type)
                 
@@ -375,94 +433,31 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
     def send_discord_notification(self, subject, message, notification_type="info"):
         """Send Discord webhook notification with rich embeds"""
         try:
-            # Get Discord config safely
-            discord_config = getattr(sys.modules['config'], 'DISCORD_NOTIFICATIONS', {"enabled": False})
-            
-            if not discord_config.get("enabled", False):
+            if not self._discord_enabled:
                 return
             
-            # Determine embed color based on notification type
-            color_map = discord_config.get("embed_color", {})
-            if isinstance(color_map, dict):
-                color = color_map.get(notification_type, 0x0080FF)  # Default to blue
-            else:
-                color = 0x0080FF
-            
-            # Create embed
             embed = {
                 "title": subject,
                 "description": message,
-                "color": color,
+                "color": self._discord_color_map.get(notification_type, 0x0080FF),  # Default to blue
                 "timestamp": datetime.now().isoformat(),
-                "fields": [
-                    {
-                        "name": "Server IP",
-                        "value": self.server_ip,
-                        "inline": True
-                    },
-                    {
-                        "name": "Monitor Type",
-                        "value": self.monitoring_mode,
-                        "inline": True
-                    }
-                ],
-                "footer": {
-                    "text": "Server Monitor",
-                    "icon_url": "https://cdn.discordapp.com/emojis/1234567890123456789.png"  # Optional
-                }
+                "fields": self._discord_static_fields,
+                "footer": self.DISCORD_FOOTER
             }
             
             # Add status field based on notification type
-            if notification_type == "offline":
-                embed["fields"].append({
-                    "name": "Status",
-                    "value": ":red_circle: OFFLINE",
-                    "inline": True
-                })
-            elif notification_type == "online":
-                embed["fields"].append({
-                    "name": "Status", 
-                    "value": ":green_circle: ONLINE",
-                    "inline": True
-                })
-            elif notification_type == "restart":
-                embed["fields"].append({
-                    "name": "Status",
-                    "value": ":yellow_circle: RESTARTING",
-                    "inline": True
-                })
-            
-            # Prepare Discord payload
-            payload = {
-                "username": discord_config.get("username", "Server Monitor"),
-                "embeds": [embed]
-            }
-            
-            # Add avatar if configured
-            if discord_config.get("avatar_url"):
-                payload["avatar_url"] = discord_config["avatar_url"]
-            
-            # Add mentions if configured
-            mentions = []
-            if discord_config.get("mention_role"):
-                mentions.append(f"<@&{discord_config['mention_role']}>")
-            if discord_config.get("mention_user"):
-                mentions.append(f"<@{discord_config['mention_user']}>")
-            
-            if mentions:
-                payload["content"] = " ".join(mentions)
-            
-            # Send to Discord
-            webhook_url = discord_config.get("webhook_url")
-            if webhook_url:
-                response = requests.post(
-                    webhook_url,
-                    json=payload,
-                    timeout=discord_config.get("timeout", 30)
-                )
-                response.raise_for_status()
-                
-                logger.info("SUCCESS: Discord notification sent")
+            status_field = self.DISCORD_STATUS_FIELDS.get(notification_type)
+            if status_field:
+                embed["fields"] = self._discord_static_fields + [status_field]
+            
+            payload = dict(self._discord_payload_base, embeds=[embed])
+            
+            # Hand off to the notification worker so the monitor never waits on Discord
+            if self._discord_webhook:
+                try:
+                    self._notify_queue.put_nowait((self._discord_webhook, payload, self._discord_timeout))
+                except queue.Full:
+                    logger.warning("Discord notification queue full, dropping: %s", subject)
             else:
                 logger.warning("Discord webhook URL not configured")
             
@@ -470,19 +465,42 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
             logger.error("FAILED: Discord notification error: %s", e)
             raise
     
-    def monitor_server(self):
-        """Main monitoring logic"""
-        self.last_check_time = datetime.now()
-        
-        # Run comprehensive checks
-        is_online, check_results = self.run_comprehensive_checks()
-        
-        if is_online:
-            if not self.is_server_online:
-                # Server just came back online
-                offline_duration = datetime.now() - self.offline_start_time if self.offline_start_time else "unknown"
-                logger.info("SUCCESS: Server %s is back ONLINE! (offline for %s)", self.server_ip, offline_duration)
-                
+    def _notify_worker(self):
+        """Deliver queued Discord notifications in the background"""
+        while True:
+            webhook_url, payload, timeout = self._notify_queue.get()
+            try:
+                self._post_discord_payload(webhook_url, payload, timeout)
+            except Exception as e:
+                logger.error("FAILED: Discord notification error: %s", e)
+            finally:
+                self._notify_queue.task_done()
+    
+    def _post_discord_payload(self, webhook_url, payload, timeout, max_attempts=3):
+        """POST a webhook payload, backing off when Discord rate limits us"""
+        body = orjson.dumps(payload) if orjson else json.dumps(payload).encode('utf-8')
+        for attempt in range(1, max_attempts + 1):
+            response = requests.post(webhook_url, data=body, headers=self.JSON_HEADERS, timeout=timeout)
+            
+            if response.status_code == 429 and attempt < max_attempts:
+                retry_after = float(response.headers.get("Retry-After", 1))
+                logger.warning("Discord rate limited, retrying in %.1fs", retry_after)
+                time.sleep(retry_after)
+                continue
+            
+            response.raise_for_status()
+            logger.info("SUCCESS: Discord notification sent")
+            return
+    
+    def _handle_online(self, check_results):
+        """Record a successful check, announcing recovery if the server was offline"""
+        if not self.is_server_online:
+            # Server just came back online
+            offline_duration = datetime.now() - self.offline_start_time if self.offline_start_time else "unknown"
+            logger.info("SUCCESS: Server %s is back ONLINE! (offline for %s)", self.server_ip, offline_duration)
+            
+            # Only announce recovery from an outage that was announced
+            if self._offline_alert_sent:
                 self.send_notification(
                     "Server Recovery Detected",
                     f"Server {self.server_ip} is back online!\n"
@@ -491,14 +509,44 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
                     f"Resuming normal monitoring...",
                     "online"
                 )
-                
-                # Reset counters
-                self.consecutive_failures = 0
-                self.restart_attempts = 0
-                self.offline_start_time = None
-                
-            self.is_server_online = True
-            logger.info("SUCCESS: Server %s online - %s", self.server_ip, check_results)
+            else:
+                logger.info("NOTIFICATION: Recovery notice suppressed, no offline alert was sent")
+            
+            # Reset counters
+            self.consecutive_failures = 0
+            self.restart_attempts = 0
+            self.offline_start_time = None
+            self._offline_alert_sent = False
+            
+        self.is_server_online = True
+        logger.info("SUCCESS: Server %s online - %s", self.server_ip, check_results)
+    
+    def _wait_for_recovery(self, poll_interval=30):
+        """Poll after a restart until the server answers, returning True if a stop was requested"""
+        started = time.monotonic()
+        deadline = started + self.restart_wait_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._wait(min(poll_interval, remaining)):
+                return True
+            
+            is_online, check_results = self.run_comprehensive_checks()
+            if is_online:
+                logger.info("RECOVERY: Server back online %.0fs after restart", time.monotonic() - started)
+                self._handle_online(check_results)
+                return False
+    
+    def monitor_server(self):
+        """Main monitoring logic"""
+        self.last_check_time = datetime.now()
+        
+        # Run comprehensive checks
+        is_online, check_results = self.run_comprehensive_checks()
+        
+        if is_online:
+            self._handle_online(check_results)
             
         else:
             self.consecutive_failures += 1
@@ -508,14 +556,21 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
                 self.offline_start_time = datetime.now()
                 logger.warning("ALERT: Server %s went OFFLINE!", self.server_ip)
                 
-                self.send_notification(
-                    "ALERT: Server Offline Detected",
-                    f"Server {self.server_ip} is not responding!\n"
-                    f"Check results: {check_results}\n"
-                    f"Consecutive failures: {self.consecutive_failures}\n"
-                    f"Attempting automatic restart...",
-                    "offline"
-                )
+                # While flapping, a real outage is still announced by the restart alerts
+                flapping = (self._last_false_alarm is not None and
+                            time.monotonic() - self._last_false_alarm < self.NOTIFICATION_COOLDOWN_SECONDS)
+                self._offline_alert_sent = not flapping
+                if flapping:
+                    logger.info("NOTIFICATION: Offline alert suppressed, server is flapping")
+                else:
+                    self.send_notification(
+                        "ALERT: Server Offline Detected",
+                        f"Server {self.server_ip} is not responding!\n"
+                        f"Check results: {check_results}\n"
+                        f"Consecutive failures: {self.consecutive_failures}\n"
+                        f"Attempting automatic restart...",
+                        "offline"
+                    )
                 
                 self.is_server_online = False
             
@@ -529,18 +584,22 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
                 
                 # Perform additional verification checks with short intervals
                 verification_failures = 0
-                verification_count = getattr(sys.modules['config'], 'VERIFICATION_CHECKS', 3)
-                verification_interval = getattr(sys.modules['config'], 'VERIFICATION_INTERVAL_SECONDS', 30)
+                verification_successes = 0
+                verification_count = self.verification_count
+                verification_interval = self.verification_interval
                 
                 for i in range(verification_count):
                     logger.info("VERIFY: Verification check %d/%d...", i + 1, verification_count)
-                    time.sleep(verification_interval)  # Wait between verification checks
+                    if self._wait(verification_interval):  # Wait between verification checks
+                        return
                     
-                    is_online, verify_results = self.run_comprehensive_checks()
+                    # Use the longer timeout here to ride out transient packet loss
+                    is_online, verify_results = self.run_comprehensive_checks(timeout=self.verification_timeout)
                     if not is_online:
                         verification_failures += 1
                         logger.warning("VERIFY: Verification check %d/%d FAILED - %s", i + 1, verification_count, verify_results)
                     else:
+                        verification_successes += 1
                         logger.info("VERIFY: Verification check %d/%d PASSED - %s", i + 1, verification_count, verify_results)
                         break
                 
@@ -556,6 +615,7 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
                         f"Proceeding with automatic restart...",
                         "restart"
                     )
+                    self._offline_alert_sent = True
                     
                     logger.info("ACTION: Attempting server restart (failures: %d, attempts: %d, verified: %d/%d)...", 
                                self.consecutive_failures, self.restart_attempts, verification_failures, verification_count)
@@ -563,35 +623,54 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
                     restart_success = self.attempt_server_restart()
                     
                     if restart_success:
-                        # Wait 5 minutes after restart before resuming checks
-                        logger.info("WAIT: Waiting 5 minutes for server to restart...")
-                        time.sleep(300)  # 5 minutes
+                        # Keep checking while the server restarts so recovery is noticed right away
+                        logger.info("WAIT: Waiting up to %d seconds for server to restart...", self.restart_wait_seconds)
+                        if self._wait_for_recovery():
+                            return
                         self.consecutive_failures = 0
                 else:
                     logger.info("RECOVERY: Server responded during verification checks. Resetting failure counter.")
+                    initial_failures = self.consecutive_failures
                     self.consecutive_failures = 0
                     self.is_server_online = True
+                    self.offline_start_time = None
+                    self._last_false_alarm = time.monotonic()
                     
-                    # Send recovery notification
-                    self.send_notification(
-                        "INFO: False Alarm - Server Responsive",
-                        f"Server {self.server_ip} responded during verification checks.\n"
-                        f"Initial failures: {self.consecutive_failures}\n"
-                        f"Verification passed: {verification_count - verification_failures}/{verification_count}\n"
-                        f"Resuming normal monitoring...",
-                        "info"
-                    )
+                    # Resolve the offline alert, if one went out for this flap
+                    if self._offline_alert_sent:
+                        self._offline_alert_sent = False
+                        self.send_notification(
+                            "INFO: False Alarm - Server Responsive",
+                            f"Server {self.server_ip} responded during verification checks.\n"
+                            f"Initial failures: {initial_failures}\n"
+                            f"Verification passed: {verification_successes}/{verification_count}\n"
+                            f"Resuming normal monitoring...",
+                            "info"
+                        )
+                    else:
+                        logger.info("NOTIFICATION: False alarm notice suppressed, no offline alert was sent")
+    
+    def _wait(self, seconds):
+        """Sleep for up to `seconds`, returning True early if a stop was requested"""
+        return self._stop_event.wait(seconds)
+    
+    def _handle_stop_signal(self, signum, frame):
+        """Request a clean shutdown from a signal handler"""
+        logger.info("SHUTDOWN: Received signal %d", signum)
+        self._stop_event.set()
     
     def run(self):
         """Run the monitoring service"""
+        signal.signal(signal.SIGTERM, self._handle_stop_signal)
+        
         logger.info("STARTUP: Production Server Monitor Starting")
         logger.info("CONFIG: Server = %s", self.server_ip)
-        logger.info("CONFIG: Check interval = %d minutes", CHECK_INTERVAL_MINUTES)
-        logger.info("CONFIG: Discord notifications = %s", "ENABLED" if getattr(sys.modules['config'], 'DISCORD_NOTIFICATIONS', {}).get("enabled") else "DISABLED")
+        logger.info("CONFIG: Check interval = %d minutes", self.check_interval_minutes)
+        logger.info("CONFIG: Discord notifications = %s", "ENABLED" if self._discord_enabled else "DISABLED")
         
         # Verify API access at startup
         logger.info("STARTUP: Verifying Hetzner Robot API access...")
-        api_capable, api_message = self.verify_api_restart_capability()
+        api_capable, api_message = self.verify_api_at_startup()
         if api_capable:
             logger.info("STARTUP: ✅ API access verified - %s", api_message)
         else:
@@ -600,17 +679,27 @@ Monitor will continue checking for recovery every {CHECK_INTERVAL_MINUTES} minut
         
         # Initial check
         logger.info("INIT: Performing initial server check...")
+        interval = self.check_interval_minutes * 60
+        next_run = time.monotonic()
         self.monitor_server()
         
-        # Schedule periodic checks
-        schedule.every(CHECK_INTERVAL_MINUTES).minutes.do(self.monitor_server)
-        
         logger.info("READY: Monitor started successfully. Press Ctrl+C to stop.")
         
         try:
             while True:
-                schedule.run_pending()
-                time.sleep(30)
+                # Run against fixed deadlines so slow checks don't make the interval drift
+                next_run += interval
+                sleep_for = next_run - time.monotonic()
+                if sleep_for < 0:
+                    # A check overran the interval (e.g. restart wait), start a fresh cadence
+                    next_run = time.monotonic()
+                    sleep_for = 0
+                
+                if self._wait(sleep_for):
+                    break
+                self.monitor_server()
+            
+            logger.info("SHUTDOWN: Monitor stopped")
                 
         except KeyboardInterrupt:
             logger.info("SHUTDOWN: Monitor stopped by user")
@@ -623,9 +712,9 @@ def main():
     """Main entry point"""
     print("Production Server Monitor")
     print("=" * 50)
-    print(f"Server: {SERVER_IP}")
-    print(f"Interval: {CHECK_INTERVAL_MINUTES} minutes")
-    print(f"Discord: {'ENABLED' if getattr(sys.modules['config'], 'DISCORD_NOTIFICATIONS', {}).get('enabled') else 'DISABLED'}")
+    print(f"Server: {config.SERVER_IP}")
+    print(f"Interval: {config.CHECK_INTERVAL_MINUTES} minutes")
+    print(f"Discord: {'ENABLED' if getattr(config, 'DISCORD_NOTIFICATIONS', {}).get('enabled') else 'DISABLED'}")
     print("=" * 50)
     
     monitor = ProductionServerMonitor()
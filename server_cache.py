@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Server Number Cache
+===================
+
+Remembers which Hetzner server number belongs to SERVER_IP so the monitor and
+the API test script don't have to download the full /server list on every run.
+The mapping is stored as JSON next to this file and expires after a day, or as
+soon as config.py is modified. The ETag/Last-Modified of the server list it came
+from are kept as well, so an expired entry can be revalidated with a conditional
+request instead of downloading the list again.
+"""
+
+import os
+import json
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(BASE_DIR, '.server_cache.json')
+CONFIG_FILE = os.path.join(BASE_DIR, 'config.py')
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+
+def _config_mtime():
+    """Modification time of config.py, so edits to it invalidate the cache"""
+    try:
+        return os.path.getmtime(CONFIG_FILE)
+    except OSError:
+        return None
+
+
+def _read_cache(path):
+    """Read the cache file, treating a missing or corrupt file as empty"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def load_server_number(server_ip, path=CACHE_FILE, ttl=CACHE_TTL_SECONDS):
+    """Return the cached server number for server_ip, or None if missing or expired"""
+    entry = _read_cache(path).get(server_ip)
+    if not isinstance(entry, dict):
+        return None
+    if time.time() - entry.get('ts', 0) > ttl:
+        return None
+    if entry.get('config_mtime') != _config_mtime():
+        return None
+    return entry.get('server_number')
+
+
+def load_validators(server_ip, path=CACHE_FILE):
+    """Return (server_number, headers) for revalidating an entry, ignoring expiry
+
+    headers holds If-None-Match / If-Modified-Since for the server list request
+    and is empty when the entry has nothing to revalidate with.
+    """
+    entry = _read_cache(path).get(server_ip)
+    if not isinstance(entry, dict) or entry.get('server_number') is None:
+        return None, {}
+
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return entry['server_number'], headers
+
+
+def response_validators(headers, sent=None):
+    """ETag/Last-Modified to store for a response, as keyword arguments for save_server_number
+
+    A 304 usually omits them, so pass the validators that were sent with the
+    request as `sent` to keep those instead of losing them.
+    """
+    sent = sent or {}
+    return {
+        'etag': headers.get('ETag') or sent.get('If-None-Match'),
+        'last_modified': headers.get('Last-Modified') or sent.get('If-Modified-Since')
+    }
+
+
+def save_server_number(server_ip, server_number, path=CACHE_FILE, etag=None, last_modified=None):
+    """Store the server number for server_ip, replacing the cache file atomically"""
+    data = _read_cache(path)
+    data[server_ip] = {
+        'server_number': server_number,
+        'ts': time.time(),
+        'config_mtime': _config_mtime(),
+        'etag': etag,
+        'last_modified': last_modified
+    }
+
+    _write_cache(data, path)
+
+
+def forget_server_number(server_ip, path=CACHE_FILE):
+    """Drop the cached entry for server_ip, e.g. after the API rejected its number"""
+    data = _read_cache(path)
+    if data.pop(server_ip, None) is not None:
+        _write_cache(data, path)
+
+
+def _write_cache(data, path):
+    """Replace the cache file atomically"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
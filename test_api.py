@@ -7,10 +7,20 @@ This script tests the Hetzner Robot API connection for the server monitor.
 Use this to verify your API credentials and server access before running the main monitor.
 """
 
-import requests
-import base64
 import sys
 import json
+import argparse
+
+import server_cache
+
+API_URL = "https://robot-ws.your-server.de"
+
+# Reset types worth calling out in step 3, in display order
+RESET_TYPE_LABELS = (
+    ('hw', "Hardware reset"),
+    ('sw', "Software reset"),
+    ('power', "Power cycle")
+)
 
 # Import config
 try:
@@ -19,132 +29,179 @@ except ImportError:
     print("ERROR: Could not import Hetzner credentials from config.py")
     sys.exit(1)
 
-def test_api_connection():
+def _check_config():
+    """Return (problem, hint) for the first unconfigured credential, or None"""
+    if not HETZNER_USERNAME or "YOUR_USERNAME" in HETZNER_USERNAME:
+        return ("Hetzner username not configured",
+                "Set HETZNER_USERNAME to your Hetzner Robot web service username")
+    if not HETZNER_PASSWORD or "YOUR_PASSWORD" in HETZNER_PASSWORD:
+        return ("Hetzner password not configured",
+                "Set HETZNER_PASSWORD to your Hetzner Robot web service password")
+    if not SERVER_IP or "YOUR_SERVER" in SERVER_IP:
+        return ("Server IP not configured",
+                "Set SERVER_IP to your server's main IP address")
+    return None
+
+# The placeholder checks only depend on config.py, so run them once at import
+CONFIG_PROBLEM = _check_config()
+
+def lookup_server_number(pool, headers):
+    """Fetch the server list and return the server number for SERVER_IP, or None
+
+    The number is cached together with the list's ETag/Last-Modified, so a
+    later lookup can revalidate with a conditional request and skip the body.
+    """
+    from http_client import json_loads
+    
+    # Optional streaming JSON parser for the server list
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+    
+    # Test 1: Get server list, unless it is unchanged since we last cached our server
+    print("\n🔍 Step 1: Testing API authentication...")
+    cached_number, validators = server_cache.load_validators(SERVER_IP)
+    response = pool.request("GET", f"{API_URL}/server", headers={**headers, **validators},
+                            preload_content=False)
+    
+    if response.status != 200:
+        # No body to stream below, so hand the connection back to the pool for step 3
+        body = response.data.decode('utf-8', 'replace')
+        response.release_conn()
+    
+    if response.status == 304 and cached_number is not None:
+        print("✅ SUCCESS: API authentication working",
+              "\n🔍 Step 2: Checking server access...",
+              f"✅ SUCCESS: Server list unchanged, still server {SERVER_IP} (#{cached_number})", sep="\n")
+        save_server_number(cached_number, response, sent=validators)
+        return cached_number
+    elif response.status == 401:
+        print("❌ FAILED: Invalid credentials (HTTP 401)",
+              "   Check your Hetzner Robot web service username and password", sep="\n")
+        return None
+    elif response.status != 200:
+        print(f"❌ FAILED: API request failed (HTTP {response.status})",
+              f"   Response: {body}", sep="\n")
+        return None
+        
+    print("✅ SUCCESS: API authentication working")
+    
+    # Test 2: Find our server
+    print("\n🔍 Step 2: Checking server access...")
+    if ijson:
+        # Parse entries one at a time so the scan can stop at our server
+        servers = (entry['server'] for entry in ijson.items(response, 'item'))
+    else:
+        servers = (entry['server'] for entry in json_loads(response.data))
+    
+    # Index only what the not-found report needs while scanning
+    by_ip = {}
+    for server_info in servers:
+        if server_info['server_ip'] == SERVER_IP:
+            server_number = server_info['server_number']
+            print(f"✅ SUCCESS: Found server {SERVER_IP} (#{server_number})",
+                  f"   Server Name: {server_info.get('server_name', 'N/A')}",
+                  f"   Product: {server_info.get('product', 'N/A')}",
+                  f"   Status: {server_info.get('status', 'N/A')}", sep="\n")
+            
+            # Drain the rest unparsed so the connection can be reused by later steps
+            response.drain_conn()
+            response.release_conn()
+            save_server_number(server_number, response)
+            return server_number
+        by_ip[server_info['server_ip']] = server_info['server_number']
+    
+    lines = [f"❌ FAILED: Server {SERVER_IP} not found in your account", "   Available servers:"]
+    lines += [f"     • {ip} (#{number})" for ip, number in by_ip.items()]
+    print(*lines, sep="\n")
+    return None
+
+def save_server_number(server_number, response, sent=None):
+    """Cache the server number along with the server list's validators"""
+    try:
+        server_cache.save_server_number(
+            SERVER_IP, server_number,
+            **server_cache.response_validators(response.headers, sent)
+        )
+    except OSError as e:
+        print(f"⚠️  WARNING: Could not cache server number: {e}")
+
+def test_api_connection(refresh=False):
     """Test Hetzner Robot API connection and server access"""
     
-    print("Hetzner Robot API Test")
-    print("=" * 40)
+    print("Hetzner Robot API Test", "=" * 40, sep="\n")
     
     # Check credentials
-    if not HETZNER_USERNAME or "YOUR_USERNAME" in HETZNER_USERNAME:
-        print("❌ Hetzner username not configured")
-        print("   Set HETZNER_USERNAME to your Hetzner Robot web service username")
-        return False
-        
-    if not HETZNER_PASSWORD or "YOUR_PASSWORD" in HETZNER_PASSWORD:
-        print("❌ Hetzner password not configured") 
-        print("   Set HETZNER_PASSWORD to your Hetzner Robot web service password")
-        return False
-        
-    if not SERVER_IP or "YOUR_SERVER" in SERVER_IP:
-        print("❌ Server IP not configured")
-        print("   Set SERVER_IP to your server's main IP address")
+    if CONFIG_PROBLEM:
+        problem, hint = CONFIG_PROBLEM
+        print(f"❌ {problem}", f"   {hint}", sep="\n")
         return False
     
-    print(f"✅ Username: {HETZNER_USERNAME}")
-    print(f"✅ Server IP: {SERVER_IP}")
-    print(f"✅ API Endpoint: https://robot-ws.your-server.de")
+    print(f"✅ Username: {HETZNER_USERNAME}",
+          f"✅ Server IP: {SERVER_IP}",
+          f"✅ API Endpoint: {API_URL}", sep="\n")
+    
+    # Load the HTTP stack only once the config checks have passed, so config
+    # errors and --help come back without paying for it
+    import urllib3
+    from http_client import POOL, is_timeout, json_loads
     
     try:
-        # Prepare authentication
-        auth_string = f"{HETZNER_USERNAME}:{HETZNER_PASSWORD}"
-        auth_bytes = auth_string.encode('ascii')
-        auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-        
-        headers = {
-            'Authorization': f'Basic {auth_b64}',
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        
-        # Test 1: Get server list
-        print("\n🔍 Step 1: Testing API authentication...")
-        servers_url = "https://robot-ws.your-server.de/server"
-        
-        response = requests.get(servers_url, headers=headers, timeout=30)
-        
-        if response.status_code == 401:
-            print("❌ FAILED: Invalid credentials (HTTP 401)")
-            print("   Check your Hetzner Robot web service username and password")
-            return False
-        elif response.status_code != 200:
-            print(f"❌ FAILED: API request failed (HTTP {response.status_code})")
-            print(f"   Response: {response.text}")
-            return False
-            
-        print("✅ SUCCESS: API authentication working")
-        
-        # Test 2: Find our server
-        print("\n🔍 Step 2: Checking server access...")
-        servers_data = response.json()
-        server_number = None
-        server_found = False
-        
-        for server_entry in servers_data:
-            server_info = server_entry['server']
-            if server_info['server_ip'] == SERVER_IP:
-                server_number = server_info['server_number']
-                server_found = True
-                print(f"✅ SUCCESS: Found server {SERVER_IP} (#{server_number})")
-                print(f"   Server Name: {server_info.get('server_name', 'N/A')}")
-                print(f"   Product: {server_info.get('product', 'N/A')}")
-                print(f"   Status: {server_info.get('status', 'N/A')}")
-                break
+        headers = urllib3.make_headers(basic_auth=f"{HETZNER_USERNAME}:{HETZNER_PASSWORD}")
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
         
-        if not server_found:
-            print(f"❌ FAILED: Server {SERVER_IP} not found in your account")
-            print("   Available servers:")
-            for server_entry in servers_data:
-                server_info = server_entry['server']
-                print(f"     • {server_info['server_ip']} (#{server_info['server_number']})")
-            return False
-            
-        # Test 3: Check reset capability
-        print("\n🔍 Step 3: Testing server reset capability...")
-        reset_url = f"https://robot-ws.your-server.de/reset/{server_number}"
-        
-        # Use HEAD request to test endpoint without triggering action
-        test_response = requests.head(reset_url, headers=headers, timeout=30)
-        
-        if test_response.status_code == 200:
-            print("✅ SUCCESS: Server reset endpoint accessible")
-        elif test_response.status_code == 404:
-            print("❌ FAILED: Server reset not available for this server")
-            print("   This server may not support API-based resets")
-            return False
+        # Tests 1-2: Resolve our server number, skipping the server list when cached
+        server_number = None if refresh else server_cache.load_server_number(SERVER_IP)
+        if server_number is not None:
+            print(f"\n🔍 Steps 1-2: Using cached server number #{server_number} (run with --refresh to re-check)")
         else:
-            print(f"⚠️  WARNING: Unexpected response from reset endpoint (HTTP {test_response.status_code})")
+            server_number = lookup_server_number(POOL, headers)
+            if server_number is None:
+                return False
         
-        # Test 4: Get reset options
-        print("\n🔍 Step 4: Checking available reset options...")
-        reset_response = requests.get(reset_url, headers=headers, timeout=30)
+        # Test 3: Check reset capability and options. A successful GET proves the
+        # endpoint is accessible, so no separate probe request is needed.
+        print("\n🔍 Step 3: Testing server reset capability...")
+        reset_response = POOL.request("GET", f"{API_URL}/reset/{server_number}", headers=headers)
         
-        if reset_response.status_code == 200:
-            reset_data = reset_response.json()
+        if reset_response.status == 200:
+            reset_data = json_loads(reset_response.data)
             reset_info = reset_data['reset']
             reset_types = reset_info.get('type', [])
             
-            print(f"✅ SUCCESS: Reset options available: {', '.join(reset_types)}")
-            
-            if 'hw' in reset_types:
-                print("   • Hardware reset: Available")
-            if 'sw' in reset_types:
-                print("   • Software reset: Available") 
-            if 'power' in reset_types:
-                print("   • Power cycle: Available")
+            lines = [
+                "✅ SUCCESS: Server reset endpoint accessible",
+                f"✅ SUCCESS: Reset options available: {', '.join(reset_types)}"
+            ]
+            lines += [f"   • {label}: Available" for reset_type, label in RESET_TYPE_LABELS if reset_type in reset_types]
+            print(*lines, sep="\n")
+        elif reset_response.status == 401:
+            print("❌ FAILED: Invalid credentials (HTTP 401)",
+                  "   Check your Hetzner Robot web service username and password", sep="\n")
+            return False
+        elif reset_response.status == 404:
+            print("❌ FAILED: Server reset not available for this server",
+                  "   This server may not support API-based resets", sep="\n")
+            return False
+        else:
+            print(f"⚠️  WARNING: Unexpected response from reset endpoint (HTTP {reset_response.status})")
                 
-        print(f"\n✅ ALL TESTS PASSED!")
-        print(f"   Your Hetzner Robot API is ready for automatic server restarts.")
+        print("\n✅ ALL TESTS PASSED!",
+              "   Your Hetzner Robot API is ready for automatic server restarts.", sep="\n")
         return True
         
-    except requests.exceptions.Timeout:
-        print("❌ FAILED: Request timeout")
-        print("   Check your internet connection")
+    except urllib3.exceptions.MaxRetryError as e:
+        if is_timeout(e):
+            print("❌ FAILED: Request timeout", "   Check your internet connection", sep="\n")
+        else:
+            print(f"❌ FAILED: Connection error: {e.reason}",
+                  "   Check your internet connection and DNS resolution", sep="\n")
         return False
-    except requests.exceptions.ConnectionError as e:
-        print(f"❌ FAILED: Connection error: {e}")
-        print("   Check your internet connection and DNS resolution")
+    except urllib3.exceptions.TimeoutError:
+        print("❌ FAILED: Request timeout", "   Check your internet connection", sep="\n")
         return False
-    except json.JSONDecodeError:
+    except json.JSONDecodeError:  # Also raised by orjson
         print("❌ FAILED: Invalid JSON response from API")
         return False
     except Exception as e:
@@ -187,7 +244,12 @@ SERVER_IP = "95.216.39.178"      # Your server's main IP
 
 def main():
     """Main function"""
-    success = test_api_connection()
+    parser = argparse.ArgumentParser(description="Test Hetzner Robot API access for the server monitor")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore the cached server number and fetch the server list again")
+    args = parser.parse_args()
+    
+    success = test_api_connection(refresh=args.refresh)
     
     if not success:
         show_api_setup_instructions()
@@ -7,9 +7,7 @@ This script tests Discord webhook notifications for the server monitor.
 Use this to verify your Discord webhook configuration before running the main monitor.
 """
 
-import requests
 import sys
-from datetime import datetime
 
 # Import config
 try:
@@ -18,72 +16,96 @@ except ImportError:
     print("ERROR: Could not import DISCORD_NOTIFICATIONS from config.py")
     sys.exit(1)
 
+# Static parts of the test embed
+TEST_EMBED_TEMPLATE = {
+    "title": "🧪 Discord Webhook Test",
+    "description": "This is a test message from your server monitor!\n\nIf you can see this, Discord notifications are working correctly.",
+    "fields": (
+        {
+            "name": "Test Server",
+            "value": "95.216.39.178",
+            "inline": True
+        },
+        {
+            "name": "Monitor Status",
+            "value": "✅ Testing",
+            "inline": True
+        },
+        {
+            "name": "Configuration",
+            "value": "Discord webhook integration",
+            "inline": False
+        }
+    ),
+    "footer": {
+        "text": "Server Monitor Test",
+    }
+}
+
 def test_discord_webhook():
     """Test Discord webhook with a sample message"""
     
     print("Discord Webhook Test")
     print("=" * 40)
     
+    # Read the config once up front
+    cfg = DISCORD_NOTIFICATIONS
+    enabled = cfg.get("enabled", False)
+    webhook_url = cfg.get("webhook_url", "")
+    username = cfg.get("username", "Server Monitor")
+    color = (cfg.get("embed_color") or {}).get("info", 0x0080FF)
+    timeout = cfg.get("timeout", 30)
+    avatar_url = cfg.get("avatar_url")
+    mention_role = cfg.get("mention_role")
+    mention_user = cfg.get("mention_user")
+    
     # Check if Discord notifications are enabled
-    if not DISCORD_NOTIFICATIONS.get("enabled", False):
+    if not enabled:
         print("❌ Discord notifications are DISABLED in config.py")
         print("   Set DISCORD_NOTIFICATIONS['enabled'] = True to enable")
         return False
     
-    webhook_url = DISCORD_NOTIFICATIONS.get("webhook_url", "")
     if not webhook_url or "YOUR_WEBHOOK" in webhook_url:
         print("❌ Discord webhook URL not configured")
         print("   Set DISCORD_NOTIFICATIONS['webhook_url'] to your Discord webhook URL")
         return False
     
     print(f"✅ Webhook URL: {webhook_url[:50]}...")
-    print(f"✅ Username: {DISCORD_NOTIFICATIONS.get('username', 'Server Monitor')}")
+    print(f"✅ Username: {username}")
+    
+    # Load the HTTP stack only once the config checks have passed, so config
+    # errors come back without paying for it
+    import urllib3
+    import json
+    from http_client import POOL, is_timeout
+    from datetime import datetime
     
+    # Use the faster orjson serializer when it is installed
     try:
-        # Create test embed
-        embed = {
-            "title": "🧪 Discord Webhook Test",
-            "description": "This is a test message from your server monitor!\n\nIf you can see this, Discord notifications are working correctly.",
-            "color": DISCORD_NOTIFICATIONS.get("embed_color", {}).get("info", 0x0080FF),
-            "timestamp": datetime.now().isoformat(),
-            "fields": [
-                {
-                    "name": "Test Server",
-                    "value": "95.216.39.178",
-                    "inline": True
-                },
-                {
-                    "name": "Monitor Status",
-                    "value": "✅ Testing",
-                    "inline": True
-                },
-                {
-                    "name": "Configuration",
-                    "value": "Discord webhook integration",
-                    "inline": False
-                }
-            ],
-            "footer": {
-                "text": "Server Monitor Test",
-            }
-        }
+        import orjson
+    except ImportError:
+        orjson = None
+    
+    try:
+        # Only the timestamp and color vary between runs
+        embed = {**TEST_EMBED_TEMPLATE, "timestamp": datetime.now().isoformat(), "color": color}
         
         # Prepare payload
         payload = {
-            "username": DISCORD_NOTIFICATIONS.get("username", "Server Monitor"),
+            "username": username,
             "embeds": [embed]
         }
         
         # Add avatar if configured
-        if DISCORD_NOTIFICATIONS.get("avatar_url"):
-            payload["avatar_url"] = DISCORD_NOTIFICATIONS["avatar_url"]
+        if avatar_url:
+            payload["avatar_url"] = avatar_url
         
         # Add mentions if configured
         mentions = []
-        if DISCORD_NOTIFICATIONS.get("mention_role"):
-            mentions.append(f"<@&{DISCORD_NOTIFICATIONS['mention_role']}>")
-        if DISCORD_NOTIFICATIONS.get("mention_user"):
-            mentions.append(f"<@{DISCORD_NOTIFICATIONS['mention_user']}>")
+        if mention_role:
+            mentions.append(f"<@&{mention_role}>")
+        if mention_user:
+            mentions.append(f"<@{mention_user}>")
         
         if mentions:
             payload["content"] = f"🧪 **Discord Test** {' '.join(mentions)}"
@@ -93,26 +115,33 @@ def test_discord_webhook():
         print("\n📤 Sending test message to Discord...")
         
         # Send to Discord
-        response = requests.post(
+        body = orjson.dumps(payload) if orjson else json.dumps(payload).encode('utf-8')
+        
+        response = POOL.request(
+            "POST",
             webhook_url,
-            json=payload,
-            timeout=DISCORD_NOTIFICATIONS.get("timeout", 30)
+            body=body,
+            headers={"Content-Type": "application/json"},
+            timeout=urllib3.Timeout(connect=5, read=timeout)  # Fail fast on connect, configured read timeout
         )
         
-        if response.status_code == 204:
+        if response.status == 204:
             print("✅ SUCCESS: Test message sent to Discord!")
             print("   Check your Discord channel to see the test message.")
             return True
         else:
-            print(f"❌ FAILED: Discord returned status {response.status_code}")
-            print(f"   Response: {response.text}")
+            print(f"❌ FAILED: Discord returned status {response.status}")
+            print(f"   Response: {response.data.decode('utf-8', 'replace')}")
             return False
             
-    except requests.exceptions.Timeout:
-        print("❌ FAILED: Request timeout")
+    except urllib3.exceptions.MaxRetryError as e:
+        if is_timeout(e):
+            print("❌ FAILED: Request timeout")
+        else:
+            print(f"❌ FAILED: Connection error: {e.reason}")
         return False
-    except requests.exceptions.ConnectionError as e:
-        print(f"❌ FAILED: Connection error: {e}")
+    except urllib3.exceptions.TimeoutError:
+        print("❌ FAILED: Request timeout")
         return False
     except Exception as e:
         print(f"❌ FAILED: Unexpected error: {e}")